@@ -48,7 +48,6 @@ import argparse
 import os
 import os.path as osp
 import time
-from collections import defaultdict
 
 import magnum as mn
 import numpy as np
@@ -78,19 +77,18 @@ def step_env(env, action_name, action_args):
     return env.step({"action": action_name, "action_args": action_args})
 
 
-def get_input_vel_ctlr(
-    skip_pygame, arm_action, env, not_block_input, agent_to_control
-):
-    if skip_pygame:
-        return step_env(env, "empty", {}), None, False
-    multi_agent = len(env._sim.robots_mgr) > 1
-
+def get_action_keys(env, agent_to_control):
+    """
+    Resolves the action names, argument keys, arm action space and arm
+    controller used to control `agent_to_control`. These do not change over
+    the lifetime of `env`.
+    """
     arm_action_name = "arm_action"
     base_action_name = "base_velocity"
     arm_key = "arm_action"
     grip_key = "grip_action"
     base_key = "base_vel"
-    if multi_agent:
+    if len(env._sim.robots_mgr) > 1:
         agent_k = f"agent_{agent_to_control}"
         arm_action_name = f"{agent_k}_{arm_action_name}"
         base_action_name = f"{agent_k}_{base_action_name}"
@@ -98,22 +96,56 @@ def get_input_vel_ctlr(
         grip_key = f"{agent_k}_{grip_key}"
         base_key = f"{agent_k}_{base_key}"
 
-    if arm_action_name in env.action_space.spaces:
+    has_arm_action = arm_action_name in env.action_space.spaces
+    if has_arm_action:
         arm_action_space = env.action_space.spaces[arm_action_name].spaces[
             arm_key
         ]
         arm_ctrlr = env.task.actions[arm_action_name].arm_ctrlr
-        base_action = None
     else:
         arm_action_space = np.zeros(7)
         arm_ctrlr = None
+
+    return {
+        "arm_action_name": arm_action_name,
+        "base_action_name": base_action_name,
+        "arm_key": arm_key,
+        "grip_key": grip_key,
+        "base_key": base_key,
+        "has_arm_action": has_arm_action,
+        "arm_action_space": arm_action_space,
+        "arm_ctrlr": arm_ctrlr,
+    }
+
+
+def get_input_vel_ctlr(
+    skip_pygame, arm_action, env, not_block_input, action_keys
+):
+    if skip_pygame:
+        return step_env(env, "empty", {}), None, False
+
+    arm_action_name = action_keys["arm_action_name"]
+    base_action_name = action_keys["base_action_name"]
+    arm_key = action_keys["arm_key"]
+    grip_key = action_keys["grip_key"]
+    base_key = action_keys["base_key"]
+    arm_action_space = action_keys["arm_action_space"]
+    arm_ctrlr = action_keys["arm_ctrlr"]
+    if action_keys["has_arm_action"]:
+        base_action = None
+    else:
         base_action = [0, 0]
 
+    # Allocate the returned action with a trailing slot for the grasp up
+    # front and edit the arm part in place through a view.
     if arm_action is None:
-        arm_action = np.zeros(arm_action_space.shape[0])
+        action_buf = np.zeros(arm_action_space.shape[0] + 1)
         given_arm_action = False
     else:
+        action_buf = np.empty(len(arm_action) + 1)
+        action_buf[:-1] = arm_action
         given_arm_action = True
+    arm_action = action_buf[:-1]
 
     end_ep = False
     magic_grasp = None
@@ -227,18 +259,17 @@ def get_input_vel_ctlr(
         if given_arm_action:
             # The grip is also contained in the provided action
             args = {
-                arm_key: arm_action[:-1],
+                arm_key: arm_action[:-1].copy(),
                 grip_key: arm_action[-1],
             }
         else:
-            args = {arm_key: arm_action, grip_key: magic_grasp}
+            # Arm actions may modify their input in place, so hand the env a
+            # copy to keep the recorded action untouched.
+            args = {arm_key: arm_action.copy(), grip_key: magic_grasp}
 
-    if magic_grasp is None:
-        arm_action = [*arm_action, 0.0]
-    else:
-        arm_action = [*arm_action, magic_grasp]
+    action_buf[-1] = 0.0 if magic_grasp is None else magic_grasp
 
-    return step_env(env, name, args), arm_action, end_ep
+    return step_env(env, name, args), action_buf, end_ep
 
 
 def get_wrapped_prop(venv, prop):
@@ -325,9 +356,9 @@ def play_env(env, args, config):
 
     use_arm_actions = None
     if args.load_actions is not None:
-        with open(args.load_actions, "rb") as f:
-            use_arm_actions = np.load(f)
-            logger.info("Loaded arm actions")
+        # Memory-map the recording, only the row for the current step is read.
+        use_arm_actions = np.load(args.load_actions, mmap_mode="r")
+        logger.info("Loaded arm actions")
 
     obs = env.reset()
 
@@ -351,6 +382,9 @@ def play_env(env, args, config):
         GfxReplayMeasure.cls_uuid, None
     )
     is_multi_agent = len(env._sim.robots_mgr) > 1
+    # Action keys per controlled agent, resolved the first time each agent
+    # is controlled.
+    agent_action_keys = {}
 
     while True:
         if (
@@ -363,7 +397,7 @@ def play_env(env, args, config):
             break
 
         if args.no_render:
-            keys = defaultdict(lambda: False)
+            keys = None
         else:
             keys = pygame.key.get_pressed()
 
@@ -374,6 +408,11 @@ def play_env(env, args, config):
                 f"Controlled agent changed. Controlling agent {agent_to_control}."
             )
 
+        if agent_to_control not in agent_action_keys:
+            agent_action_keys[agent_to_control] = get_action_keys(
+                env, agent_to_control
+            )
+
         step_result, arm_action, end_ep = get_input_vel_ctlr(
             args.no_render,
             use_arm_actions[update_idx]
@@ -381,7 +420,7 @@ def play_env(env, args, config):
             else None,
             env,
             not free_cam.is_free_cam_mode,
-            agent_to_control,
+            agent_action_keys[agent_to_control],
         )
 
         if not args.no_render and keys[pygame.K_c]: